@@ -1,6 +1,9 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
+from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode
 from datetime import datetime, timedelta
 import os
 import sys
@@ -8,8 +11,8 @@ import sys
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from database import PaperDatabase
-from config import APP_TITLE, APP_DESCRIPTION
+from database import PaperDatabase, SUMMARY_FIELDS
+from config import APP_TITLE, APP_DESCRIPTION, MAX_CHART_POINTS
 
 # Page config
 st.set_page_config(
@@ -18,8 +21,47 @@ st.set_page_config(
     layout="wide"
 )
 
-# Initialize database
-db = PaperDatabase()
+# Category badge markup shown on paper details
+_BADGE = "<span style='background-color:#e6f3ff; padding:3px 7px; border-radius:10px; margin-right:5px;'>{}</span>"
+
+@st.cache_resource
+def get_db():
+    """Share a single PaperDatabase instance across reruns and sessions."""
+    return PaperDatabase()
+
+# Cached database reads so widget interactions replay from memory instead of sqlite.
+# Results are returned as tuples of dicts to keep hashing and copying cheap.
+@st.cache_data(ttl=300, show_spinner=False)
+def _recent(days, min_relevance, sort_by):
+    return tuple(get_db().get_recent_papers(
+        days=days, min_relevance=min_relevance, sort_by=sort_by, fields=SUMMARY_FIELDS
+    ))
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _by_category(category, days, min_relevance, sort_by):
+    return tuple(get_db().get_papers_by_category(
+        category, days=days, min_relevance=min_relevance, sort_by=sort_by, fields=SUMMARY_FIELDS
+    ))
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _detail(paper_id):
+    return get_db().get_paper_detail(paper_id)
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _categories():
+    return get_db().get_all_categories()
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _category_counts(days, category, min_relevance):
+    return tuple(get_db().get_category_counts(days=days, min_relevance=min_relevance, category=category))
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _relevance_counts(days, category, min_relevance):
+    return tuple(get_db().get_relevance_histogram(days=days, min_relevance=min_relevance, category=category))
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _stats():
+    return get_db().get_stats()
 
 def main():
     # Header
@@ -39,7 +81,7 @@ def main():
     )
     
     # Category filter
-    categories = ["All Categories"] + db.get_all_categories()
+    categories = ["All Categories"] + _categories()
     selected_category = st.sidebar.selectbox("Attack category", categories)
     
     # Relevance score filter
@@ -50,168 +92,229 @@ def main():
         value=1
     )
     
+    # Sort options (ordering is done in SQL)
+    sort_options = {
+        "Newest first": "newest",
+        "Highest relevance first": "relevance",
+        "Oldest first": "oldest"
+    }
+    
+    sort_by = st.sidebar.selectbox(
+        "Sort by", 
+        options=list(sort_options.keys()),
+        index=0
+    )
+    
     # Get papers based on filters
     if selected_category == "All Categories":
-        papers = db.get_recent_papers(days=selected_days, min_relevance=min_relevance)
+        papers = _recent(selected_days, min_relevance, sort_options[sort_by])
     else:
-        papers = db.get_papers_by_category(selected_category, days=selected_days)
-        # Apply relevance filter manually since it's not part of category query
-        papers = [p for p in papers if p.get('relevance_score', 0) >= min_relevance]
+        papers = _by_category(selected_category, selected_days, min_relevance, sort_options[sort_by])
     
     # Database stats in sidebar
-    st.sidebar.title("Database Stats")
-    stats = db.get_stats()
-    st.sidebar.metric("Total Papers", stats['total_papers'])
-    st.sidebar.metric("Processed Papers", stats['processed_papers'])
-    st.sidebar.metric("New Papers (Last 7 Days)", stats['recent_papers'])
+    render_stats()
     
     # Main content
     tabs = st.tabs(["Papers", "Analytics"])
     
     # Papers tab
     with tabs[0]:
-        st.header("Research Papers")
-        
-        # No papers message
-        if not papers:
-            st.info(f"No papers found matching your criteria. Try adjusting the filters.")
-            return
-            
-        # Papers count
-        st.write(f"Found **{len(papers)}** papers matching your criteria.")
-        
-        # Sort options
-        sort_options = {
-            "Newest first": lambda x: x.get('published', ''),
-            "Highest relevance first": lambda x: -x.get('relevance_score', 0),
-            "Oldest first": lambda x: -x.get('published', '')
-        }
-        
-        sort_by = st.selectbox(
-            "Sort by", 
-            options=list(sort_options.keys()),
-            index=0
-        )
-        
-        # Sort papers
-        sorted_papers = sorted(papers, key=sort_options[sort_by], reverse=sort_by=="Newest first")
-        
-        # Display papers
-        for i, paper in enumerate(sorted_papers):
-            with st.expander(f"{paper['title']}"):
-                # Paper metadata
-                cols = st.columns([3, 1])
-                
-                with cols[0]:
-                    st.write(f"**Authors:** {', '.join(paper['authors'])}")
-                    st.write(f"**Published:** {paper['published']}")
-                    
-                    # Categories with styling
-                    if paper.get('attack_categories'):
-                        st.write("**Attack Categories:**")
-                        cat_html = " ".join([f"<span style='background-color:#e6f3ff; padding:3px 7px; border-radius:10px; margin-right:5px;'>{cat}</span>" for cat in paper['attack_categories']])
-                        st.markdown(cat_html, unsafe_allow_html=True)
-                
-                with cols[1]:
-                    # Relevance score with color
-                    score = paper.get('relevance_score', 0)
-                    if score >= 8:
-                        color = "#ff4b4b"  # Red for high relevance
-                    elif score >= 5:
-                        color = "#ffa64b"  # Orange for medium relevance
-                    else:
-                        color = "#4b8bff"  # Blue for low relevance
-                        
-                    st.markdown(f"""
-                    <div style='background-color:{color}; padding:10px; border-radius:5px; text-align:center; color:white;'>
-                        <div style='font-size:12px'>Relevance Score</div>
-                        <div style='font-size:24px; font-weight:bold;'>{score}/10</div>
-                    </div>
-                    """, unsafe_allow_html=True)
-                
-                # Paper summaries
-                st.subheader("Brief Overview")
-                st.write(paper.get('brief_overview', 'No overview available'))
-                
-                st.subheader("Technical Explanation")
-                st.write(paper.get('technical_explanation', 'No technical explanation available'))
-                
-                # Links 
-                st.write("**Links:**")
-                col1, col2 = st.columns(2)
-                col1.markdown(f"[View Abstract]({paper['abstract_url']})")
-                col2.markdown(f"[Download PDF]({paper['pdf_url']})")
-                
-                # Add separator if not last item
-                if i < len(sorted_papers) - 1:
-                    st.markdown("---")
+        render_papers(papers)
     
     # Analytics tab
     with tabs[1]:
         if papers:
-            st.header("Paper Analytics")
-            
-            # Prepare data for charts
-            df = pd.DataFrame(papers)
-            
-            # Add date column
-            df['date'] = pd.to_datetime(df['published'])
-            
-            # Create two columns
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                # Papers by category
-                if 'attack_categories' in df.columns:
-                    # Flatten categories
-                    categories_flat = []
-                    for cats in df['attack_categories']:
-                        if isinstance(cats, list) and cats:
-                            categories_flat.extend(cats)
-                    
-                    if categories_flat:
-                        # Count occurrences of each category
-                        category_counts = pd.Series(categories_flat).value_counts()
-                        
-                        # Create pie chart
-                        fig1 = px.pie(
-                            names=category_counts.index,
-                            values=category_counts.values,
-                            title='Distribution of Attack Categories',
-                            hole=0.3
-                        )
-                        st.plotly_chart(fig1, use_container_width=True)
-            
-            with col2:
-                # Papers by relevance score
-                if 'relevance_score' in df.columns:
-                    # Group by relevance score
-                    relevance_counts = df['relevance_score'].value_counts().sort_index()
-                    
-                    # Create bar chart
-                    fig2 = px.bar(
-                        x=relevance_counts.index,
-                        y=relevance_counts.values,
-                        title='Papers by Relevance Score',
-                        labels={'x': 'Relevance Score', 'y': 'Number of Papers'},
-                        color=relevance_counts.index,
-                        color_continuous_scale='Viridis'
-                    )
-                    st.plotly_chart(fig2, use_container_width=True)
+            category = None if selected_category == "All Categories" else selected_category
+            render_analytics(papers, selected_days, category, min_relevance)
+
+def render_stats():
+    """Render database statistics in the sidebar."""
+    st.sidebar.title("Database Stats")
+    stats = _stats()
+    st.sidebar.metric("Total Papers", stats['total_papers'])
+    st.sidebar.metric("Processed Papers", stats['processed_papers'])
+    st.sidebar.metric("New Papers (Last 7 Days)", stats['recent_papers'])
+
+def render_papers(papers):
+    """Render the papers grid and the details of the selected paper."""
+    st.header("Research Papers")
+    
+    # No papers message
+    if not papers:
+        st.info(f"No papers found matching your criteria. Try adjusting the filters.")
+        return
+        
+    # Papers count
+    st.write(f"Found **{len(papers)}** papers matching your criteria.")
+    
+    # Paginated grid with one row per paper; only the selected row is rendered in full
+    grid_df = pd.DataFrame({
+        'id': [p['id'] for p in papers],
+        'title': [p['title'] for p in papers],
+        'published': [p['published'] for p in papers],
+        'relevance_score': [p.get('relevance_score') for p in papers],
+        'attack_categories': [', '.join(p.get('attack_categories') or []) for p in papers],
+    })
+    
+    gb = GridOptionsBuilder.from_dataframe(grid_df)
+    gb.configure_column('id', hide=True)
+    gb.configure_column('title', header_name='Title', flex=3)
+    gb.configure_column('published', header_name='Published', flex=1)
+    gb.configure_column('relevance_score', header_name='Relevance', flex=1)
+    gb.configure_column('attack_categories', header_name='Attack Categories', flex=2)
+    gb.configure_pagination(paginationAutoPageSize=False, paginationPageSize=25)
+    gb.configure_selection('single')
+    
+    grid = AgGrid(
+        grid_df,
+        gridOptions=gb.build(),
+        update_mode=GridUpdateMode.SELECTION_CHANGED,
+        reload_data=True,
+        key='papers-grid'
+    )
+    
+    # Remember the selection across reruns so a single detail panel is rendered lazily
+    selected = grid['selected_rows']
+    if selected:
+        st.session_state.selected_id = selected[0]['id']
+    
+    selected_id = st.session_state.get('selected_id')
+    paper = next((p for p in papers if p['id'] == selected_id), None) if selected_id else None
+    if paper is None:
+        st.session_state.pop('selected_id', None)
+        st.caption("Select a paper to view its details.")
+        return
+    
+    # List rows carry only summary columns; fetch the text fields for the selected paper
+    render_paper_details({**paper, **_detail(paper['id'])})
+
+def render_paper_details(paper):
+    """Render the full details of a single paper."""
+    st.subheader(paper['title'])
+    
+    # Paper metadata
+    cols = st.columns([3, 1])
+    
+    with cols[0]:
+        st.write(f"**Authors:** {', '.join(paper['authors'])}")
+        st.write(f"**Published:** {paper['published']}")
+        
+        # Categories with styling
+        if paper.get('attack_categories'):
+            st.write("**Attack Categories:**")
+            cat_html = ''.join(map(_BADGE.format, paper['attack_categories']))
+            st.markdown(cat_html, unsafe_allow_html=True)
+    
+    with cols[1]:
+        # Relevance score with color
+        score = paper.get('relevance_score', 0)
+        if score >= 8:
+            color = "#ff4b4b"  # Red for high relevance
+        elif score >= 5:
+            color = "#ffa64b"  # Orange for medium relevance
+        else:
+            color = "#4b8bff"  # Blue for low relevance
             
-            # Time series of papers
-            if 'date' in df.columns:
-                # Group by date
-                papers_by_date = df.groupby(df['date'].dt.date).size()
-                
-                # Create time series chart
-                fig3 = px.line(
-                    x=papers_by_date.index,
-                    y=papers_by_date.values,
-                    title='Papers Published Over Time',
-                    labels={'x': 'Date', 'y': 'Number of Papers'}
-                )
-                st.plotly_chart(fig3, use_container_width=True)
+        st.markdown(f"""
+        <div style='background-color:{color}; padding:10px; border-radius:5px; text-align:center; color:white;'>
+            <div style='font-size:12px'>Relevance Score</div>
+            <div style='font-size:24px; font-weight:bold;'>{score}/10</div>
+        </div>
+        """, unsafe_allow_html=True)
+    
+    # Paper summaries
+    st.subheader("Brief Overview")
+    st.write(paper.get('brief_overview') or 'No overview available')
+    
+    st.subheader("Technical Explanation")
+    st.write(paper.get('technical_explanation') or 'No technical explanation available')
+    
+    # Links 
+    st.write("**Links:**")
+    col1, col2 = st.columns(2)
+    col1.markdown(f"[View Abstract]({paper['abstract_url']})")
+    col2.markdown(f"[Download PDF]({paper['pdf_url']})")
+
+# Figure builders are cached on their (small, hashable) aggregate inputs so reruns
+# that don't change the data reuse the serialized figure instead of rebuilding it.
+@st.cache_data(ttl=300, show_spinner=False)
+def _category_pie(category_counts):
+    names, values = zip(*category_counts)
+    return px.pie(
+        names=names,
+        values=values,
+        title='Distribution of Attack Categories',
+        hole=0.3
+    ).to_dict()
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _relevance_bar(relevance_counts):
+    scores, counts = zip(*relevance_counts)
+    return px.bar(
+        x=scores,
+        y=counts,
+        title='Papers by Relevance Score',
+        labels={'x': 'Relevance Score', 'y': 'Number of Papers'},
+        color=scores,
+        color_continuous_scale='Viridis'
+    ).to_dict()
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _timeline(papers_by_date, bucket='day'):
+    dates, counts = zip(*papers_by_date)
+    return px.line(
+        x=np.asarray(dates),
+        y=np.asarray(counts, dtype=np.int32),
+        title=f'Papers Published Over Time (per {bucket})',
+        labels={'x': 'Date', 'y': f'Number of Papers per {bucket}'},
+        render_mode='webgl'
+    ).to_dict()
+
+def render_analytics(papers, days, category, min_relevance):
+    """Render the analytics charts."""
+    st.header("Paper Analytics")
+    
+    # Category and relevance counts are aggregated in SQL
+    category_counts = _category_counts(days, category, min_relevance)
+    relevance_counts = tuple(
+        (score, count) for score, count in _relevance_counts(days, category, min_relevance)
+        if score is not None
+    )
+    
+    # Publication dates for the time series
+    dates = pd.DatetimeIndex(pd.to_datetime([p['published'] for p in papers], format='%Y-%m-%d'))
+    
+    # Create two columns
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        # Papers by category
+        if category_counts:
+            # Create pie chart
+            fig1 = go.Figure(_category_pie(category_counts))
+            st.plotly_chart(fig1, use_container_width=True)
+    
+    with col2:
+        # Papers by relevance score
+        if relevance_counts:
+            # Create bar chart
+            fig2 = go.Figure(_relevance_bar(relevance_counts))
+            st.plotly_chart(fig2, use_container_width=True)
+    
+    # Time series of papers, grouped by date
+    papers_by_date = pd.Series(1, index=dates).resample('D').size()
+    
+    # Downsample long series into weekly, then monthly buckets before handing to Plotly
+    bucket = 'day'
+    for freq, bucket_name in (('W', 'week'), ('MS', 'month')):
+        if len(papers_by_date) <= MAX_CHART_POINTS:
+            break
+        papers_by_date = papers_by_date.resample(freq).sum()
+        bucket = bucket_name
+    
+    # Create time series chart
+    fig3 = go.Figure(_timeline(tuple(papers_by_date.items()), bucket))
+    st.plotly_chart(fig3, use_container_width=True)
 
 if __name__ == "__main__":
     main()
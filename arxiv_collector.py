@@ -3,12 +3,22 @@ import datetime
 import logging
 from config import ARXIV_KEYWORDS, MAX_RESULTS
 
+logger = logging.getLogger(__name__)
+
+ABS_URL_PREFIX = "https://arxiv.org/abs/"
+
 class ArxivCollector:
       # Collect papers from arxiv    
     def __init__(self, keywords=None, max_results=None):
         self.keywords = keywords or ARXIV_KEYWORDS
         self.max_results = max_results or MAX_RESULTS
-        self.logger = logging.getLogger(__name__)
+        
+        # Reuse one arXiv client across fetches
+        self.client = arxiv.Client(
+            page_size=100,
+            delay_seconds=3,
+            num_retries=3
+        )
     
     def construct_query(self, days=7):
         """Construct arXiv API query string with date filter."""
@@ -28,20 +38,13 @@ class ArxivCollector:
         # Combine queries
         full_query = f"({base_query}) AND ({date_query}) AND ({categories})"
         
-        self.logger.info(f"Query: {full_query}")
+        logger.info(f"Query: {full_query}")
         return full_query
     
     def fetch_papers(self, days=7):
-        """Fetch papers matching criteria from arXiv"""
+        """Fetch papers matching criteria from arXiv, yielding them as they arrive."""
         query = self.construct_query(days)
-        self.logger.info(f"Fetching papers with query: {query}")
-        
-        # Initialize arXiv client
-        client = arxiv.Client(
-            page_size=100,
-            delay_seconds=3,
-            num_retries=3
-        )
+        logger.info(f"Fetching papers with query: {query}")
         
         # Create search
         search = arxiv.Search(
@@ -51,10 +54,11 @@ class ArxivCollector:
         )
         
         # Fetch results
-        papers = []
-        for result in client.results(search):
+        count = 0
+        for result in self.client.results(search):
+            arxiv_id = result.entry_id.rsplit('/', 1)[-1]  # Extract ID from URL
             paper = {
-                'id': result.entry_id.split('/')[-1],  # Extract ID from URL
+                'id': arxiv_id,
                 'title': result.title,
                 'authors': [author.name for author in result.authors],
                 'summary': result.summary,
@@ -62,11 +66,11 @@ class ArxivCollector:
                 'updated': result.updated.strftime('%Y-%m-%d'),
                 'arxiv_categories': result.categories,
                 'pdf_url': result.pdf_url,
-                'abstract_url': f"https://arxiv.org/abs/{result.entry_id.split('/')[-1]}",
+                'abstract_url': ABS_URL_PREFIX + arxiv_id,
                 'processed': False,
                 'processed_at': None,
             }
-            papers.append(paper)
+            count += 1
+            yield paper
         
-        self.logger.info(f"Fetched {len(papers)} papers")
-        return papers
+        logger.info(f"Fetched {count} papers")
@@ -27,12 +27,41 @@ ARXIV_KEYWORDS = [
     "reward hacking"
 ]
 MAX_RESULTS = int(os.environ.get("MAX_RESULTS", "100"))
+COLLECTION_BATCH_SIZE = int(os.environ.get("COLLECTION_BATCH_SIZE", "50"))  # papers saved per write
 
 # LLM settings
 LLM_PROVIDER = os.environ.get("LLM_PROVIDER", "anthropic").lower()  # "anthropic" or "openai"
 LLM_MODEL = os.environ.get("LLM_MODEL", "claude-3-haiku-20240307" if LLM_PROVIDER == "anthropic" else "gpt-4o-mini")
 BATCH_SIZE = int(os.environ.get("BATCH_SIZE", "5"))
 PROCESSING_DELAY = int(os.environ.get("PROCESSING_DELAY", "2"))  # seconds between batches
+MAX_CONCURRENCY = int(os.environ.get("MAX_CONCURRENCY", "8"))  # concurrent LLM requests per batch
+
+# Optional keyword prefilter: papers whose title and abstract match neither an ARXIV_KEYWORDS
+# phrase nor one of these stems skip the LLM and are filed under PREFILTER_CATEGORY, which is
+# kept out of the category lists. The stems cover every attack category named in the LLM prompt.
+# Prefiltered papers carry PREFILTER_MARKER as their processing_error so they can be re-queued.
+KEYWORD_PREFILTER = os.environ.get("KEYWORD_PREFILTER", "false").lower() == "true"
+PREFILTER_CATEGORY = "off-topic"
+PREFILTER_MARKER = "prefiltered"
+PREFILTER_PATTERNS = [
+    r"red[\s-]?team",
+    r"jailbreak",
+    r"prompt[\s-]+injection",
+    r"adversarial",
+    r"backdoor",
+    r"trojan",
+    r"poison",
+    r"steal",
+    r"theft",
+    r"extraction",
+    r"membership[\s-]+inference",
+    r"privacy",
+    r"reward[\s-]+hack",
+    r"social[\s-]+engineer",
+    r"security",
+    r"safety",
+    r"(?:mis)?align",
+]
 
 # Email settings
 SMTP_SERVER = os.environ.get("SMTP_SERVER", "")
@@ -56,6 +85,7 @@ LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 
 # Streamlit app
 APP_TITLE = "AI Red Teaming Research Monitor"
+MAX_CHART_POINTS = int(os.environ.get("MAX_CHART_POINTS", "2000"))  # time series are bucketed above this
 APP_DESCRIPTION = """
 This application monitors and analyzes recent AI red teaming research papers from arXiv. 
 It provides summaries, technical explanations, and categorization of papers by attack types.
@@ -2,15 +2,52 @@ import sqlite3
 import json
 import logging
 import os
+import threading
 from typing import List, Dict, Any, Optional
-from config import DATABASE_PATH
+from config import DATABASE_PATH, PREFILTER_CATEGORY, PREFILTER_MARKER
+
+logger = logging.getLogger(__name__)
+
+# Columns stored as JSON-encoded text
+JSON_FIELDS = ('authors', 'arxiv_categories', 'attack_categories')
+
+# Per-connection settings: fewer fsyncs under WAL, in-memory temp tables,
+# a ~40MB page cache and a 256MB memory-mapped read window
+CONNECTION_PRAGMAS = (
+    'synchronous=NORMAL',
+    'temp_store=MEMORY',
+    'cache_size=-40000',
+    'mmap_size=268435456',
+)
+
+# Columns needed to list papers, without the large text fields
+SUMMARY_FIELDS = (
+    'id', 'title', 'authors', 'published', 'attack_categories',
+    'relevance_score', 'pdf_url', 'abstract_url'
+)
+
+# Columns an INSERT must provide; rows lacking any of them can only update
+REQUIRED_FIELDS = frozenset((
+    'id', 'title', 'authors', 'summary', 'published', 'updated',
+    'arxiv_categories', 'pdf_url', 'abstract_url'
+))
+
+# Large text columns fetched on demand for a single paper
+DETAIL_FIELDS = ('brief_overview', 'technical_explanation')
+
+# ORDER BY clauses for the supported list sort options
+SORT_ORDERS = {
+    'newest': 'published DESC',
+    'oldest': 'published ASC',
+    'relevance': 'relevance_score DESC, published DESC',
+}
 
 class PaperDatabase:
     """Handles database operations for storing and retrieving papers."""
     
     def __init__(self, db_path=None):
         self.db_path = db_path or DATABASE_PATH
-        self.logger = logging.getLogger(__name__)
+        self._tls = threading.local()
         
         # Create directory if it doesn't exist
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
@@ -18,11 +55,25 @@ class PaperDatabase:
         # Initialize database
         self._init_db()
     
+    def _conn(self):
+        """Return this thread's long-lived connection, opening it on first use."""
+        conn = getattr(self._tls, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            for pragma in CONNECTION_PRAGMAS:
+                conn.execute(f'PRAGMA {pragma}')
+            self._tls.conn = conn
+        return conn
+    
     def _init_db(self):
         """Initialize the database schema."""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._conn()
         cursor = conn.cursor()
         
+        # WAL lets readers proceed while the collector writes; the mode persists in the file
+        cursor.execute('PRAGMA journal_mode=WAL')
+        
         # Create papers table
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS papers (
@@ -46,72 +97,147 @@ class PaperDatabase:
         )
         ''')
         
-        # Create index for faster queries
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_published ON papers(published)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_processed ON papers(processed)')
+        # Composite indexes serve both the processed filter and the published/relevance ordering;
+        # they supersede the earlier single-column and three-column indexes
+        for index in ('idx_published', 'idx_processed', 'idx_proc_pub_rel'):
+            cursor.execute(f'DROP INDEX IF EXISTS {index}')
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_proc_rel_pub'")
+        new_indexes = cursor.fetchone() is None
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_proc_pub ON papers(processed, published DESC)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_proc_rel_pub ON papers(processed, relevance_score DESC, published DESC)')
+        
+        # Create paper/category junction table so category lookups are indexed equality joins
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'paper_categories'")
+        backfill = cursor.fetchone() is None
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS paper_categories (
+            paper_id TEXT NOT NULL,
+            category TEXT NOT NULL,
+            PRIMARY KEY (paper_id, category)
+        )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_pc_cat ON paper_categories(category)')
+        
+        if backfill:
+            # Populate from the JSON column for databases created before the junction table
+            cursor.execute('''
+            INSERT OR IGNORE INTO paper_categories (paper_id, category)
+            SELECT p.id, j.value
+            FROM papers p, json_each(p.attack_categories) j
+            WHERE p.attack_categories IS NOT NULL AND json_valid(p.attack_categories)
+              AND j.value != ?
+            ''', (PREFILTER_CATEGORY,))
+        
+        # Cache of LLM analysis results keyed by a hash of the paper content
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            hash TEXT PRIMARY KEY,
+            result TEXT NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
         
-        conn.commit()
-        conn.close()
+        # Gather planner statistics once the indexes exist
+        if new_indexes:
+            cursor.execute('ANALYZE')
         
-        self.logger.info("Database initialized")
+        logger.info("Database initialized")
     
     def save_papers(self, papers: List[Dict[str, Any]]):
         """Save papers to the database."""
         if not papers:
             return 0
             
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        inserted = 0
-        updated = 0
-        
+        # Group papers by the fields they carry so each group becomes one
+        # executemany UPSERT, or a plain UPDATE for partial rows that could
+        # never be inserted; fields absent from a paper are left untouched.
+        groups = {}
+        category_rows = []
         for paper in papers:
             # Convert list and dict fields to JSON strings
             paper_data = paper.copy()
-            for field in ['authors', 'arxiv_categories', 'attack_categories']:
+            for field in JSON_FIELDS:
                 if field in paper_data and isinstance(paper_data[field], (list, dict)):
                     paper_data[field] = json.dumps(paper_data[field])
             
-            # Check if paper exists
-            cursor.execute('SELECT id FROM papers WHERE id = ?', (paper['id'],))
-            exists = cursor.fetchone()
+            fields = tuple(paper_data.keys())
+            groups.setdefault(fields, []).append(tuple(paper_data[field] for field in fields))
+            
+            # Prefiltered papers stay out of the junction table, and so out of category lists
+            if isinstance(paper.get('attack_categories'), list):
+                category_rows.extend(
+                    (paper['id'], category) for category in paper['attack_categories']
+                    if category != PREFILTER_CATEGORY
+                )
+        
+        conn = self._conn()
+        
+        saved = 0
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            for fields, rows in groups.items():
+                columns = [field for field in fields if field != 'id']
+                if REQUIRED_FIELDS.issubset(fields):
+                    updates = [f"{field} = excluded.{field}" for field in columns]
+                    query = (
+                        f"INSERT INTO papers ({', '.join(fields)}) VALUES ({', '.join(['?'] * len(fields))}) "
+                        f"ON CONFLICT(id) DO UPDATE SET {', '.join(updates)}"
+                    )
+                else:
+                    # Move id to the end to bind the WHERE clause
+                    id_index = fields.index('id')
+                    rows = [row[:id_index] + row[id_index + 1:] + (row[id_index],) for row in rows]
+                    query = f"UPDATE papers SET {', '.join(f'{field} = ?' for field in columns)} WHERE id = ?"
+                cursor = conn.executemany(query, rows)
+                saved += cursor.rowcount
             
-            if exists:
-                # Update existing paper
-                fields = []
-                values = []
-                
-                for key, value in paper_data.items():
-                    if key != 'id':  # Skip the ID field
-                        fields.append(f"{key} = ?")
-                        values.append(value)
-                
-                values.append(paper['id'])  # Add ID for WHERE clause
-                
-                update_query = f"UPDATE papers SET {', '.join(fields)} WHERE id = ?"
-                cursor.execute(update_query, values)
-                updated += 1
-            else:
-                # Insert new paper
-                fields = list(paper_data.keys())
-                placeholders = ['?'] * len(fields)
-                values = [paper_data[field] for field in fields]
-                
-                insert_query = f"INSERT INTO papers ({', '.join(fields)}) VALUES ({', '.join(placeholders)})"
-                cursor.execute(insert_query, values)
-                inserted += 1
-        
-        conn.commit()
-        conn.close()
-        
-        self.logger.info(f"Saved papers: {inserted} inserted, {updated} updated")
-        return inserted + updated
+            # Replace category links for papers that carry categories
+            categorized_ids = [(paper['id'],) for paper in papers if isinstance(paper.get('attack_categories'), list)]
+            conn.executemany('DELETE FROM paper_categories WHERE paper_id = ?', categorized_ids)
+            conn.executemany('INSERT OR IGNORE INTO paper_categories (paper_id, category) VALUES (?, ?)', category_rows)
+        
+        logger.info(f"Saved papers: {saved} inserted or updated")
+        return saved
+    
+    def get_cached_results(self, keys):
+        """Get cached LLM results for the given content hashes, as a {hash: result} dict."""
+        if not keys:
+            return {}
+        
+        conn = self._conn()
+        cursor = conn.cursor()
+        
+        keys = list(keys)
+        cursor.execute(
+            f"SELECT hash, result FROM llm_cache WHERE hash IN ({', '.join(['?'] * len(keys))})",
+            keys
+        )
+        
+        results = {}
+        for key, result in cursor.fetchall():
+            try:
+                results[key] = json.loads(result)
+            except json.JSONDecodeError:
+                logger.warning(f"Failed to parse cached LLM result {key}")
+        
+        return results
+    
+    def cache_results(self, results):
+        """Store LLM results from a {hash: result} dict in a single transaction."""
+        if not results:
+            return
+        
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany(
+                'INSERT OR REPLACE INTO llm_cache (hash, result) VALUES (?, ?)',
+                [(key, json.dumps(result)) for key, result in results.items()]
+            )
     
     def get_unprocessed_papers(self, limit=None):
         """Get papers that haven't been processed yet."""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        conn = self._conn()
         cursor = conn.cursor()
         
         query = 'SELECT * FROM papers WHERE processed = 0 ORDER BY published DESC'
@@ -119,161 +245,247 @@ class PaperDatabase:
             query += f' LIMIT {limit}'
             
         cursor.execute(query)
-        rows = cursor.fetchall()
-        
-        papers = []
-        for row in rows:
-            paper = dict(row)
-            # Convert JSON strings back to Python objects
-            for field in ['authors', 'arxiv_categories', 'attack_categories']:
-                if paper[field] and isinstance(paper[field], str):
-                    try:
-                        paper[field] = json.loads(paper[field])
-                    except json.JSONDecodeError:
-                        self.logger.warning(f"Failed to parse JSON for {field} in paper {paper['id']}")
-                        paper[field] = []
-            
-            papers.append(paper)
-        
-        conn.close()
+        papers = self._fetch_papers(cursor)
         
-        self.logger.info(f"Retrieved {len(papers)} unprocessed papers")
+        logger.info(f"Retrieved {len(papers)} unprocessed papers")
         return papers
     
-    def get_papers_by_category(self, category, days=None):
-        """Get papers by attack category with optional time filter."""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+    def requeue_prefiltered(self):
+        """Mark papers skipped by the keyword prefilter as unprocessed again."""
+        conn = self._conn()
+        cursor = conn.execute('''
+        UPDATE papers
+        SET processed = 0, processed_at = NULL, processing_error = NULL,
+            brief_overview = NULL, attack_categories = NULL, relevance_score = NULL
+        WHERE processing_error = ?
+        ''', (PREFILTER_MARKER,))
+        
+        logger.info(f"Re-queued {cursor.rowcount} prefiltered papers")
+        return cursor.rowcount
+    
+    def get_papers_by_category(self, category, days=None, min_relevance=None, sort_by='newest', fields=None):
+        """Get papers by attack category with optional time and relevance filters.
+        
+        Pass ``fields`` (e.g. SUMMARY_FIELDS) to select only those columns.
+        """
+        conn = self._conn()
         cursor = conn.cursor()
         
-        params = [f'%"{category}"%']  # For JSON array search
+        params = [category]
         
-        query = "SELECT * FROM papers WHERE processed = 1 AND attack_categories LIKE ?"
+        query = f'''
+        SELECT {self._select_list(fields, 'p')} FROM papers p
+        JOIN paper_categories pc ON pc.paper_id = p.id
+        WHERE pc.category = ? AND p.processed = 1
+        '''
         
         # Add date filter if specified
         if days:
-            query += " AND date(published) >= date('now', ?)"
+            query += " AND published >= date('now', ?)"
             params.append(f'-{days} days')
         
-        query += " ORDER BY published DESC"
+        if min_relevance is not None:
+            query += " AND relevance_score >= ?"
+            params.append(min_relevance)
+        
+        query += f" ORDER BY {self._order_by(sort_by)}"
         
         cursor.execute(query, params)
-        rows = cursor.fetchall()
+        papers = self._fetch_papers(cursor)
+        
+        logger.info(f"Retrieved {len(papers)} papers for category '{category}'")
+        return papers
+    
+    def _fetch_papers(self, cursor):
+        """Fetch the rows of an executed query as paper dicts with JSON fields decoded."""
+        return list(self._iter_papers(cursor))
+    
+    def _iter_papers(self, cursor):
+        """Yield the rows of an executed query one at a time as paper dicts."""
+        columns = [column[0] for column in cursor.description]
+        json_columns = [column for column in columns if column in JSON_FIELDS]
         
-        papers = []
-        for row in rows:
-            paper = dict(row)
+        for row in cursor:
+            paper = dict(zip(columns, row))
             # Convert JSON strings back to Python objects
-            for field in ['authors', 'arxiv_categories', 'attack_categories']:
+            for field in json_columns:
                 if paper[field] and isinstance(paper[field], str):
                     try:
                         paper[field] = json.loads(paper[field])
                     except json.JSONDecodeError:
+                        logger.warning("Failed to parse JSON for %s in paper %s", field, paper.get('id'))
                         paper[field] = []
-            
-            papers.append(paper)
-        
-        conn.close()
-        
-        self.logger.info(f"Retrieved {len(papers)} papers for category '{category}'")
-        return papers
+            yield paper
+    
+    @staticmethod
+    def _select_list(fields=None, alias=None):
+        """Build the column list for a SELECT, defaulting to all columns."""
+        prefix = f"{alias}." if alias else ""
+        if not fields:
+            return f"{prefix}*"
+        return ', '.join(f"{prefix}{field}" for field in fields)
     
-    def get_recent_papers(self, days=7, min_relevance=None):
-        """Get recent processed papers with optional relevance filter."""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+    @staticmethod
+    def _order_by(sort_by):
+        """Map a sort option to an ORDER BY clause."""
+        if sort_by not in SORT_ORDERS:
+            raise ValueError(f"Unsupported sort option: {sort_by}")
+        return SORT_ORDERS[sort_by]
+    
+    def get_recent_papers(self, days=7, min_relevance=None, sort_by='newest', fields=None):
+        """Get recent processed papers with optional relevance filter.
+        
+        Pass ``fields`` (e.g. SUMMARY_FIELDS) to select only those columns.
+        """
+        conn = self._conn()
         cursor = conn.cursor()
         
         params = [f'-{days} days']
         
-        query = '''
-        SELECT * FROM papers 
+        query = f'''
+        SELECT {self._select_list(fields)} FROM papers 
         WHERE processed = 1 
-        AND date(published) >= date('now', ?)
+        AND published >= date('now', ?)
         '''
         
         if min_relevance is not None:
             query += " AND relevance_score >= ?"
             params.append(min_relevance)
             
-        query += " ORDER BY published DESC"
+        query += f" ORDER BY {self._order_by(sort_by)}"
         
         cursor.execute(query, params)
-        rows = cursor.fetchall()
+        papers = self._fetch_papers(cursor)
         
-        papers = []
-        for row in rows:
-            paper = dict(row)
-            # Convert JSON strings back to Python objects
-            for field in ['authors', 'arxiv_categories', 'attack_categories']:
-                if paper[field] and isinstance(paper[field], str):
-                    try:
-                        paper[field] = json.loads(paper[field])
-                    except json.JSONDecodeError:
-                        paper[field] = []
-            
-            papers.append(paper)
+        logger.info(f"Retrieved {len(papers)} recent papers from the last {days} days")
+        return papers
+    
+    def get_paper_detail(self, paper_id):
+        """Get the large text fields of a single paper."""
+        conn = self._conn()
+        cursor = conn.cursor()
         
-        conn.close()
+        cursor.execute(f"SELECT {', '.join(DETAIL_FIELDS)} FROM papers WHERE id = ?", (paper_id,))
+        row = cursor.fetchone()
         
-        self.logger.info(f"Retrieved {len(papers)} recent papers from the last {days} days")
-        return papers
+        return dict(row) if row else {}
+    
+    def iter_recent_papers_by_category(self, days=7, min_relevance=None):
+        """Yield recent processed papers as (category, paper) pairs, grouped in SQL.
+        
+        A paper appears once per category, papers without categories under
+        'Uncategorized'. Groups come largest first, newest papers first within each.
+        Rows are streamed from the cursor, not materialized.
+        """
+        conn = self._conn()
+        cursor = conn.cursor()
+        
+        params = [f'-{days} days']
+        
+        recent = "SELECT * FROM papers WHERE processed = 1 AND published >= date('now', ?)"
+        if min_relevance is not None:
+            recent += " AND relevance_score >= ?"
+            params.append(min_relevance)
+        
+        cursor.execute(f'''
+        WITH grouped AS (
+            SELECT COALESCE(pc.category, 'Uncategorized') AS digest_category, r.*
+            FROM ({recent}) r
+            LEFT JOIN paper_categories pc ON pc.paper_id = r.id
+        )
+        SELECT *, COUNT(*) OVER (PARTITION BY digest_category) AS category_size
+        FROM grouped
+        ORDER BY category_size DESC, digest_category, published DESC
+        ''', params)
+        
+        for paper in self._iter_papers(cursor):
+            category = paper.pop('digest_category')
+            paper.pop('category_size')
+            yield category, paper
     
     def get_all_categories(self):
         """Get all unique attack categories."""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._conn()
         cursor = conn.cursor()
         
-        cursor.execute('SELECT attack_categories FROM papers WHERE processed = 1')
-        rows = cursor.fetchall()
+        cursor.execute('SELECT DISTINCT category FROM paper_categories ORDER BY category')
+        
+        return [row[0] for row in cursor.fetchall()]
+    
+    def _aggregate_filters(self, days=None, min_relevance=None, category=None):
+        """Build the WHERE clause shared by the analytics aggregates."""
+        query = "WHERE p.processed = 1"
+        params = []
+        
+        if days:
+            query += " AND p.published >= date('now', ?)"
+            params.append(f'-{days} days')
         
-        categories = set()
-        for row in rows:
-            if row[0]:
-                try:
-                    cats = json.loads(row[0])
-                    if isinstance(cats, list):
-                        for cat in cats:
-                            categories.add(cat)
-                except json.JSONDecodeError:
-                    pass
+        if min_relevance is not None:
+            query += " AND p.relevance_score >= ?"
+            params.append(min_relevance)
         
-        conn.close()
+        if category:
+            query += " AND p.id IN (SELECT paper_id FROM paper_categories WHERE category = ?)"
+            params.append(category)
         
-        return sorted(list(categories))
+        return query, params
     
-    def get_stats(self):
-        """Get summary statistics about the database."""
-        conn = sqlite3.connect(self.db_path)
+    def get_category_counts(self, days=None, min_relevance=None, category=None):
+        """Get (category, paper count) pairs for processed papers, most common first."""
+        conn = self._conn()
         cursor = conn.cursor()
         
-        stats = {}
-        
-        # Total papers
-        cursor.execute('SELECT COUNT(*) FROM papers')
-        stats['total_papers'] = cursor.fetchone()[0]
+        filters, params = self._aggregate_filters(days, min_relevance, category)
+        cursor.execute(f'''
+        SELECT pc.category, COUNT(*) AS paper_count
+        FROM paper_categories pc
+        JOIN papers p ON p.id = pc.paper_id
+        {filters}
+        GROUP BY pc.category
+        ORDER BY paper_count DESC, pc.category
+        ''', params)
+        
+        return [tuple(row) for row in cursor.fetchall()]
+    
+    def get_relevance_histogram(self, days=None, min_relevance=None, category=None):
+        """Get (relevance score, paper count) pairs for processed papers, by ascending score."""
+        conn = self._conn()
+        cursor = conn.cursor()
         
-        # Processed papers
-        cursor.execute('SELECT COUNT(*) FROM papers WHERE processed = 1')
-        stats['processed_papers'] = cursor.fetchone()[0]
+        filters, params = self._aggregate_filters(days, min_relevance, category)
+        cursor.execute(f'''
+        SELECT p.relevance_score, COUNT(*)
+        FROM papers p
+        {filters}
+        GROUP BY p.relevance_score
+        ORDER BY p.relevance_score
+        ''', params)
         
-        # Papers by relevance
-        cursor.execute('''
-        SELECT relevance_score, COUNT(*) 
-        FROM papers 
-        WHERE processed = 1 
-        GROUP BY relevance_score
-        ORDER BY relevance_score DESC
-        ''')
-        stats['papers_by_relevance'] = dict(cursor.fetchall())
+        return [tuple(row) for row in cursor.fetchall()]
+    
+    def get_stats(self):
+        """Get summary statistics about the database."""
+        conn = self._conn()
+        cursor = conn.cursor()
         
-        # Recent papers (last 7 days)
+        # Totals in a single pass over the table
         cursor.execute('''
-        SELECT COUNT(*) FROM papers 
-        WHERE date(published) >= date('now', '-7 days')
+        SELECT
+            COUNT(*),
+            COALESCE(SUM(CASE WHEN processed = 1 THEN 1 ELSE 0 END), 0),
+            COALESCE(SUM(CASE WHEN published >= date('now', '-7 days') THEN 1 ELSE 0 END), 0)
+        FROM papers
         ''')
-        stats['recent_papers'] = cursor.fetchone()[0]
-        
-        conn.close()
+        total, processed, recent = cursor.fetchone()
+        
+        stats = {
+            'total_papers': total,
+            'processed_papers': processed,
+            # Papers by relevance, highest score first
+            'papers_by_relevance': dict(reversed(self.get_relevance_histogram())),
+            # Recent papers (last 7 days)
+            'recent_papers': recent,
+        }
         
         return stats
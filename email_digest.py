@@ -1,3 +1,4 @@
+import io
 import smtplib
 import logging
 import os
@@ -5,7 +6,9 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from datetime import datetime
 from typing import List, Dict, Any
-from collections import defaultdict
+from functools import lru_cache
+from itertools import groupby
+from operator import itemgetter
 from database import PaperDatabase
 from config import (
     SMTP_SERVER, SMTP_PORT, SMTP_USERNAME, 
@@ -13,6 +16,77 @@ from config import (
     EMAIL_SUBJECT_PREFIX, MIN_RELEVANCE_SCORE
 )
 
+logger = logging.getLogger(__name__)
+
+# Digest section templates, defined once and filled per category and per paper
+_CATEGORY_TMPL = '<h2>{category} ({count} papers)</h2>'.format
+
+_PAPER_TMPL = '''
+                <div class="paper">
+                    <div class="paper-title">{title}</div>
+                    <div class="paper-meta">
+                        <span>Authors: {authors}</span>
+                        <span> • </span>
+                        <span>Published: {published}</span>
+                        <span> • </span>
+                        <span class="relevance {relevance_class}">Relevance: {relevance_score}/10</span>
+                    </div>
+                    <div class="paper-overview">{brief_overview}</div>{also_in}
+                    <div class="links">
+                        <a href="{abstract_url}" target="_blank">Abstract</a>
+                        <a href="{pdf_url}" target="_blank">PDF</a>
+                    </div>
+                </div>
+                '''.format_map
+
+# HTML escaping for text and attribute values, done in one str.translate pass
+_HTML_TRANS = str.maketrans({
+    '&': '&amp;',
+    '<': '&lt;',
+    '>': '&gt;',
+    '"': '&quot;',
+    "'": '&#x27;',
+})
+
+def _escape(value):
+    """Escape a value for safe inclusion in the digest HTML."""
+    return str(value).translate(_HTML_TRANS)
+
+# Relevance badge class indexed by score 0-10
+_RELEVANCE_CLASS = tuple(
+    'relevance-low' if score < 5 else 'relevance-medium' if score < 8 else 'relevance-high'
+    for score in range(11)
+)
+
+def _render_paper(paper, category):
+    """Render a paper's digest block, noting its other categories besides ``category``."""
+    # Determine relevance class
+    score = paper.get('relevance_score') or 0
+    relevance_class = _RELEVANCE_CLASS[min(max(int(score), 0), 10)]
+    
+    other_categories = [c for c in (paper.get('attack_categories') or []) if c != category]
+    also_in = (
+        f'\n                    <div class="paper-also">Also in: {_escape(", ".join(other_categories))}</div>'
+        if other_categories else ''
+    )
+    
+    # Each streamed row is rendered exactly once, so its strings are built here
+    authors = paper['authors']
+    authors_str = ', '.join(authors[:3]) + (' et al.' if len(authors) > 3 else '')
+    
+    # Escape paper text before interpolating it into the HTML
+    return _PAPER_TMPL({
+        'title': _escape(paper['title']),
+        'authors': _escape(authors_str),
+        'published': _escape(paper['published']),
+        'relevance_class': relevance_class,
+        'relevance_score': paper.get('relevance_score', 'N/A'),
+        'brief_overview': _escape(paper.get('brief_overview', 'No overview available')),
+        'also_in': also_in,
+        'abstract_url': _escape(paper['abstract_url']),
+        'pdf_url': _escape(paper['pdf_url']),
+    })
+
 class EmailDigest:
     """Generates and sends weekly email digests of recent papers."""
     
@@ -27,7 +101,10 @@ class EmailDigest:
         recipients = recipient_emails or RECIPIENT_EMAILS or os.environ.get('RECIPIENT_EMAILS', '')
         self.recipient_emails = recipients.split(',') if isinstance(recipients, str) else recipients
         
-        self.logger = logging.getLogger(__name__)
+        # Database handle and rendered-sections cache, shared across digest generations
+        self._db = None
+        self._smtp = None
+        self._fetch_sections = lru_cache(maxsize=8)(self._render_sections)
         
         # Validate required config
         required = [self.smtp_server, self.username, self.password, self.sender_email, self.recipient_emails]
@@ -41,38 +118,63 @@ class EmailDigest:
                     'RECIPIENT_EMAILS': self.recipient_emails
                 }.items() if not value
             ]
-            self.logger.warning(f"Email configuration incomplete. Missing: {', '.join(missing)}")
+            logger.warning(f"Email configuration incomplete. Missing: {', '.join(missing)}")
+    
+    @property
+    def db(self):
+        """Lazily open the paper database."""
+        if self._db is None:
+            self._db = PaperDatabase()
+        return self._db
+    
+    def _render_sections(self, days, min_relevance, date_key):
+        """Render the digest's category sections in one streaming pass over the database.
+        
+        Returns ``(paper_count, category_count, sections)`` where sections are
+        ``(category, paper count, html)`` tuples, largest category first. Only the
+        rendered fragments are kept, never the paper rows. ``date_key`` only
+        scopes the cache entry.
+        """
+        sections = []
+        categories = set()
+        rendered_ids = set()
+        
+        # Rows arrive grouped by category, largest first; each paper is rendered
+        # once, under the largest category it belongs to
+        rows = self.db.iter_recent_papers_by_category(days=days, min_relevance=min_relevance)
+        for category, group in groupby(rows, key=itemgetter(0)):
+            categories.add(category)
+            fragments = []
+            for _, paper in group:
+                if paper['id'] in rendered_ids:
+                    continue
+                rendered_ids.add(paper['id'])
+                fragments.append(_render_paper(paper, category))
+            
+            if fragments:
+                sections.append((category, len(fragments), ''.join(fragments)))
+        
+        # Dedup can shrink a category below a later one; order by the counts shown
+        sections.sort(key=itemgetter(1), reverse=True)
+        
+        return len(rendered_ids), len(categories), tuple(sections)
     
     def generate_digest(self, days=7, min_relevance=None):
         """Generate HTML content for email digest based on recent papers."""
         min_relevance = min_relevance or MIN_RELEVANCE_SCORE
         
-        db = PaperDatabase()
-        papers = db.get_recent_papers(days=days, min_relevance=min_relevance)
+        # The UTC date is part of the cache key so cached results expire daily
+        paper_count, category_count, sections = self._fetch_sections(
+            days, min_relevance, datetime.utcnow().date().isoformat()
+        )
         
-        if not papers:
-            self.logger.info(f"No recent papers found in the last {days} days with relevance >= {min_relevance}")
+        if not paper_count:
+            logger.info(f"No recent papers found in the last {days} days with relevance >= {min_relevance}")
             return None
         
-        # Group papers by category
-        papers_by_category = defaultdict(list)
-        for paper in papers:
-            if not paper.get('attack_categories'):
-                papers_by_category['Uncategorized'].append(paper)
-                continue
-                
-            for category in paper['attack_categories']:
-                papers_by_category[category].append(paper)
-        
-        # Sort categories by number of papers (descending)
-        sorted_categories = sorted(
-            papers_by_category.keys(), 
-            key=lambda x: len(papers_by_category[x]), 
-            reverse=True
-        )
-        
-        # Generate HTML content
-        html = f'''
+        # Generate HTML content into a single in-memory text buffer
+        buf = io.StringIO()
+        buf.write(f'''
         <!DOCTYPE html>
         <html>
         <head>
@@ -115,6 +217,11 @@ class EmailDigest:
                 .paper-overview {{
                     margin-bottom: 10px;
                 }}
+                .paper-also {{
+                    font-size: 13px;
+                    color: #7f8c8d;
+                    margin-bottom: 10px;
+                }}
                 .relevance {{
                     display: inline-block;
                     padding: 3px 6px;
@@ -157,57 +264,30 @@ class EmailDigest:
         <body>
             <h1>AI Red Teaming Research Digest</h1>
             <p>Here are the latest AI red teaming research papers from the past {days} days:</p>
-        '''
+        ''')
         
         # Add summary counts
-        html += '<p><strong>Summary:</strong></p><ul>'
-        html += f'<li>Total papers: {len(papers)}</li>'
-        html += f'<li>Categories covered: {len(sorted_categories)}</li>'
-        html += '</ul>'
+        buf.write('<p><strong>Summary:</strong></p><ul>')
+        buf.write(f'<li>Total papers: {paper_count}</li>')
+        buf.write(f'<li>Categories covered: {category_count}</li>')
+        buf.write('</ul>')
         
         # Add papers by category
-        for category in sorted_categories:
-            category_papers = papers_by_category[category]
-            html += f'<h2>{category} ({len(category_papers)} papers)</h2>'
-            
-            for paper in category_papers:
-                # Determine relevance class
-                if paper.get('relevance_score', 0) >= 8:
-                    relevance_class = 'relevance-high'
-                elif paper.get('relevance_score', 0) >= 5:
-                    relevance_class = 'relevance-medium'
-                else:
-                    relevance_class = 'relevance-low'
-                
-                html += f'''
-                <div class="paper">
-                    <div class="paper-title">{paper['title']}</div>
-                    <div class="paper-meta">
-                        <span>Authors: {', '.join(paper['authors'][:3])}{" et al." if len(paper['authors']) > 3 else ""}</span>
-                        <span> • </span>
-                        <span>Published: {paper['published']}</span>
-                        <span> • </span>
-                        <span class="relevance {relevance_class}">Relevance: {paper.get('relevance_score', 'N/A')}/10</span>
-                    </div>
-                    <div class="paper-overview">{paper.get('brief_overview', 'No overview available')}</div>
-                    <div class="links">
-                        <a href="{paper['abstract_url']}" target="_blank">Abstract</a>
-                        <a href="{paper['pdf_url']}" target="_blank">PDF</a>
-                    </div>
-                </div>
-                '''
+        for category, count, section_html in sections:
+            buf.write(_CATEGORY_TMPL(category=_escape(category), count=count))
+            buf.write(section_html)
         
         # Add footer
-        html += f'''
+        buf.write(f'''
             <div class="footer">
                 <p>This digest was generated on {datetime.now().strftime('%Y-%m-%d')}.</p>
                 <p>For more details and filtering options, please visit our web interface.</p>
             </div>
         </body>
         </html>
-        '''
+        ''')
         
-        return html
+        return buf.getvalue()
     
     def send_digest(self, html_content=None, days=7, min_relevance=None):
         """Generate and send weekly digest email."""
@@ -215,38 +295,72 @@ class EmailDigest:
             html_content = self.generate_digest(days, min_relevance)
             
         if not html_content:
-            self.logger.info("No content to send in digest")
+            logger.info("No content to send in digest")
             return False
             
         if not all([self.smtp_server, self.username, self.password, self.sender_email, self.recipient_emails]):
-            self.logger.error("Email configuration incomplete, cannot send digest")
+            logger.error("Email configuration incomplete, cannot send digest")
             return False
         
         try:
             # Create message
             msg = MIMEMultipart()
             msg['From'] = self.sender_email
-            msg['To'] = ', '.join(self.recipient_emails)
+            # Recipients go only in the envelope (effectively BCC) so addresses aren't exposed
+            msg['To'] = self.sender_email
             
             # Add date to subject
             subject = f"{EMAIL_SUBJECT_PREFIX} {datetime.now().strftime('%Y-%m-%d')}"
             msg['Subject'] = subject
             
             # Attach HTML content
-            msg.attach(MIMEText(html_content, 'html'))
-            
-            # Connect to SMTP server
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            server.starttls()
-            server.login(self.username, self.password)
+            msg.attach(MIMEText(html_content, 'html', 'utf-8'))
             
-            # Send email
-            server.send_message(msg)
-            server.quit()
+            # Send email over the persistent connection, reconnecting once if it was dropped
+            # One SMTP transaction delivers the message to every recipient
+            envelope = {'from_addr': self.sender_email, 'to_addrs': self.recipient_emails}
+            try:
+                self._get_smtp().send_message(msg, **envelope)
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError):
+                self._smtp = None
+                self._get_smtp().send_message(msg, **envelope)
             
-            self.logger.info(f"Email digest sent to {len(self.recipient_emails)} recipients")
+            logger.info(f"Email digest sent to {len(self.recipient_emails)} recipients")
             return True
             
         except Exception as e:
-            self.logger.error(f"Failed to send email digest: {str(e)}")
+            logger.error(f"Failed to send email digest: {str(e)}")
             return False
+    
+    def _get_smtp(self):
+        """Return a live, authenticated SMTP connection, reconnecting if needed."""
+        if self._smtp is not None:
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except smtplib.SMTPException:
+                pass
+            self._smtp = None
+        
+        # Connect to SMTP server
+        server = smtplib.SMTP(self.smtp_server, self.smtp_port)
+        server.starttls()
+        server.login(self.username, self.password)
+        
+        self._smtp = server
+        return server
+    
+    def close(self):
+        """Close the SMTP connection if one is open."""
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except smtplib.SMTPException:
+                pass
+            self._smtp = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
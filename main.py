@@ -4,6 +4,7 @@ import logging
 import os
 import time
 from datetime import datetime
+from itertools import islice
 import schedule
 import sys
 
@@ -13,7 +14,7 @@ from paper_processor import PaperProcessor
 from database import PaperDatabase
 from email_digest import EmailDigest
 from config import (
-    LOG_LEVEL, LOG_FILE, LOG_FORMAT,
+    LOG_LEVEL, LOG_FILE, LOG_FORMAT, COLLECTION_BATCH_SIZE,
     COLLECTION_SCHEDULE, PROCESSING_SCHEDULE, DIGEST_SCHEDULE
 )
 
@@ -37,20 +38,23 @@ def run_collection(days=7):
         # Initialize collector
         collector = ArxivCollector()
         
-        # Fetch papers
-        papers = collector.fetch_papers(days=days)
-        
-        # Save to database
+        # Stream fetched papers into the database in batches
         db = PaperDatabase()
-        count = db.save_papers(papers)
+        papers = collector.fetch_papers(days=days)
+        count = 0
+        while True:
+            batch = list(islice(papers, COLLECTION_BATCH_SIZE))
+            if not batch:
+                break
+            count += db.save_papers(batch)
         
         logger.info(f"Collection complete: {count} papers saved")
-        return papers
+        return count
     except Exception as e:
         logger.error(f"Error in collection process: {str(e)}", exc_info=True)
-        return []
+        return 0
 
-def run_processing(limit=None):
+def run_processing(limit=None, requeue_prefiltered=False):
     """Run the paper processing with LLM."""
     logger.info("Starting paper processing")
     
@@ -63,7 +67,11 @@ def run_processing(limit=None):
         
         # Initialize components
         db = PaperDatabase()
-        processor = PaperProcessor()
+        processor = PaperProcessor(db=db)
+        
+        # Send papers the keyword prefilter skipped back through the LLM
+        if requeue_prefiltered:
+            db.requeue_prefiltered()
         
         # Get unprocessed papers
         papers = db.get_unprocessed_papers(limit=limit)
@@ -90,11 +98,9 @@ def send_weekly_digest(days=7, min_relevance=5):
     logger.info("Generating weekly digest")
     
     try:
-        # Initialize email digest
-        digest = EmailDigest()
-        
-        # Send digest
-        success = digest.send_digest(days=days, min_relevance=min_relevance)
+        # Initialize email digest and send it, closing the SMTP connection afterwards
+        with EmailDigest() as digest:
+            success = digest.send_digest(days=days, min_relevance=min_relevance)
         
         if success:
             logger.info("Weekly digest sent successfully")
@@ -133,7 +139,9 @@ def run_scheduled_tasks():
     try:
         while True:
             schedule.run_pending()
-            time.sleep(60)  # Check every minute
+            # Sleep until the next job is due (capped at an hour) instead of polling every minute
+            idle = schedule.idle_seconds()
+            time.sleep(60 if idle is None else max(1, min(idle, 3600)))
     except KeyboardInterrupt:
         logger.info("Scheduler stopped by user")
     except Exception as e:
@@ -147,6 +155,8 @@ def main():
     parser.add_argument("--schedule", action="store_true", help="Run as a scheduled service")
     parser.add_argument("--days", type=int, default=7, help="Number of days to look back for papers")
     parser.add_argument("--limit", type=int, help="Limit number of papers to process")
+    parser.add_argument("--requeue-prefiltered", action="store_true",
+                        help="Re-process papers previously skipped by the keyword prefilter (with --process)")
     
     args = parser.parse_args()
     
@@ -160,7 +170,7 @@ def main():
         run_collection(days=args.days)
     
     if args.process:
-        run_processing(limit=args.limit)
+        run_processing(limit=args.limit, requeue_prefiltered=args.requeue_prefiltered)
     
     if args.digest:
         send_weekly_digest(days=args.days)
@@ -1,132 +1,214 @@
-import time
+import asyncio
+import hashlib
 import json
 import logging
+import re
 from typing import List, Dict, Any
 import os
 import datetime
-from config import LLM_MODEL, LLM_PROVIDER, BATCH_SIZE, PROCESSING_DELAY
+from config import (
+    LLM_MODEL, LLM_PROVIDER, BATCH_SIZE, PROCESSING_DELAY, MAX_CONCURRENCY,
+    ARXIV_KEYWORDS, KEYWORD_PREFILTER, PREFILTER_PATTERNS, PREFILTER_CATEGORY, PREFILTER_MARKER
+)
+
+logger = logging.getLogger(__name__)
 
 # Import appropriate client libraries based on configuration
 if LLM_PROVIDER == "anthropic":
-    from anthropic import Anthropic, AnthropicError
+    from anthropic import AsyncAnthropic, AnthropicError
 elif LLM_PROVIDER == "openai":
     import openai
 else:
     raise ValueError(f"Unsupported LLM provider: {LLM_PROVIDER}")
 
+# orjson is optional; it is faster than the stdlib parser and its
+# JSONDecodeError subclasses json.JSONDecodeError
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = None
+
+_JSON_DECODER = json.JSONDecoder()
+
+# Cheap relevance check run before paying for an LLM call; the collection keywords
+# are always included so the filter can never reject what the arXiv query asked for
+_PREFILTER_RE = re.compile(r"\b(?:" + "|".join([
+    *PREFILTER_PATTERNS,
+    *(r"[\s-]+".join(map(re.escape, keyword.split())) for keyword in ARXIV_KEYWORDS),
+]) + ")", re.IGNORECASE)
+
+# Analysis prompt; the static instructions are defined once and only the paper fields vary
+_PROMPT_TMPL = """
+        You are an expert in AI security and AI red teaming research. Analyze this research paper and provide:
+        
+        1. A brief overview (2-3 sentences summarizing the paper's main contribution)
+        2. A technical explanation (5-7 sentences explaining the key technical details)
+        3. Categorization by attack type (choose the most relevant categories from: prompt injection, jailbreaking, adversarial examples, 
+           model extraction, data poisoning, model backdoor attacks, privacy attacks, model stealing, 
+           reward hacking, social engineering, or any other relevant category). They must be related to AI Red teaming research specifically. 
+        4. Relevance score for AI red teaming (1-10, with 10 being most relevant)
+        
+        Paper Title: {title}
+        Authors: {authors}
+        Abstract: {abstract}
+        
+        Return ONLY a JSON object with these keys:
+        {{
+          "brief_overview": "...",
+          "technical_explanation": "...",
+          "categories": ["category1", "category2"],
+          "relevance_score": number
+        }}
+        """
+
 class PaperProcessor:
     """Processes papers using cost-effective LLM APIs."""
     
-    def __init__(self, api_key=None, model=None, batch_size=None):
+    def __init__(self, api_key=None, model=None, batch_size=None, db=None):
         self.api_key = api_key or os.environ.get(f"{LLM_PROVIDER.upper()}_API_KEY")
         if not self.api_key:
             raise ValueError(f"No API key provided for {LLM_PROVIDER}")
             
         self.model = model or LLM_MODEL
         self.batch_size = batch_size or BATCH_SIZE
-        self.logger = logging.getLogger(__name__)
-        
-        # Initialize the appropriate client
+        self.db = db  # Optional PaperDatabase used to cache LLM results by paper content
+        self.client = None
+    
+    def _create_client(self):
+        """Create the async client for the configured provider."""
         if LLM_PROVIDER == "anthropic":
-            self.client = Anthropic(api_key=self.api_key)
+            return AsyncAnthropic(api_key=self.api_key)
         elif LLM_PROVIDER == "openai":
-            self.client = openai.OpenAI(api_key=self.api_key)
+            return openai.AsyncOpenAI(api_key=self.api_key)
     
     def process_papers(self, papers: List[Dict[str, Any]]):
         """Process multiple papers in cost-effective batches."""
         if not papers:
-            self.logger.info("No papers to process")
+            logger.info("No papers to process")
             return []
             
+        # Run all batches on one event loop so the async client's connections are reused
+        return asyncio.run(self._process_papers(papers))
+    
+    async def _process_papers(self, papers: List[Dict[str, Any]]):
+        """Process papers batch by batch on the running event loop."""
+        # Bound in-flight LLM requests, however large the batch
+        self._semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
         processed_papers = []
         
-        # Process papers in batches to reduce API costs
-        for i in range(0, len(papers), self.batch_size):
-            batch = papers[i:i+self.batch_size]
-            self.logger.info(f"Processing batch {i//self.batch_size + 1}/{(len(papers)-1)//self.batch_size + 1} with {len(batch)} papers")
-            
-            processed_batch = self._process_batch(batch)
-            processed_papers.extend(processed_batch)
-            
-            # Avoid rate limits with delay between batches
-            if i + self.batch_size < len(papers):
-                self.logger.info(f"Sleeping for {PROCESSING_DELAY} seconds between batches")
-                time.sleep(PROCESSING_DELAY)
+        # The client's connection pool is bound to this loop, so it is opened
+        # and closed here rather than shared across process_papers calls
+        async with self._create_client() as client:
+            self.client = client
+            try:
+                # Process papers in batches to reduce API costs
+                for i in range(0, len(papers), self.batch_size):
+                    batch = papers[i:i+self.batch_size]
+                    logger.info("Processing batch %d/%d with %d papers", i//self.batch_size + 1, (len(papers)-1)//self.batch_size + 1, len(batch))
+                    
+                    processed_batch = await self._process_batch(batch)
+                    processed_papers.extend(processed_batch)
+                    
+                    # Avoid rate limits with delay between batches
+                    if i + self.batch_size < len(papers):
+                        logger.info(f"Sleeping for {PROCESSING_DELAY} seconds between batches")
+                        await asyncio.sleep(PROCESSING_DELAY)
+            finally:
+                self.client = None
         
         return processed_papers
     
-    def _process_batch(self, batch: List[Dict[str, Any]]):
-        """Process a batch of papers."""
-        processed_batch = []
-        
+    async def _process_batch(self, batch: List[Dict[str, Any]]):
+        """Process a batch of papers, sending their LLM requests concurrently."""
+        to_process = []
         for paper in batch:
             # Skip already processed papers
             if paper.get('processed', False):
-                self.logger.info(f"Skipping already processed paper: {paper['id']}")
-                processed_batch.append(paper)
-                continue
-            
-            try:
-                # Create prompt for LLM
-                prompt = self._create_prompt(paper)
-                
-                # Get response from LLM
-                llm_response = self._call_llm(prompt)
-                
-                # Parse the response
-                parsed_result = self._parse_response(llm_response)
-                
-                # Update paper with processed information
+                logger.info("Skipping already processed paper: %s", paper['id'])
+            elif KEYWORD_PREFILTER and not _PREFILTER_RE.search(f"{paper['title']} {paper['summary']}"):
+                # Obviously off-topic papers are classified without an LLM call
+                logger.info("Paper %s matched no prefilter keywords, marking off-topic", paper['id'])
                 paper.update({
-                    'brief_overview': parsed_result.get('brief_overview', 'Not provided'),
-                    'technical_explanation': parsed_result.get('technical_explanation', 'Not provided'),
-                    'attack_categories': parsed_result.get('categories', ['unclassified']),
-                    'relevance_score': parsed_result.get('relevance_score', 0),
+                    'brief_overview': 'Filtered by keyword prefilter',
+                    'attack_categories': [PREFILTER_CATEGORY],
+                    'relevance_score': 0,
+                    'processing_error': PREFILTER_MARKER,
                     'processed': True,
                     'processed_at': datetime.datetime.now().isoformat()
                 })
-                
-                self.logger.info(f"Successfully processed paper: {paper['id']}")
-            except Exception as e:
-                self.logger.error(f"Error processing paper {paper['id']}: {str(e)}")
+            else:
+                to_process.append(paper)
+        
+        # Reuse cached results for papers whose title and abstract were already analyzed
+        keys = [self._cache_key(paper) for paper in to_process]
+        cached = self.db.get_cached_results(set(keys)) if self.db else {}
+        
+        # Call the LLM once per distinct uncached paper content
+        pending = {}
+        for key, paper in zip(keys, to_process):
+            if key not in cached:
+                pending.setdefault(key, paper)
+        if cached:
+            logger.info(f"Reusing cached LLM results for {len(to_process) - len(pending)} papers")
+        
+        fresh = dict(zip(pending, await asyncio.gather(
+            *(self._analyze_paper(paper) for paper in pending.values()),
+            return_exceptions=True
+        )))
+        
+        if self.db:
+            self.db.cache_results({
+                key: result for key, result in fresh.items() if not isinstance(result, Exception)
+            })
+        
+        results = [cached[key] if key in cached else fresh[key] for key in keys]
+        for paper, result in zip(to_process, results):
+            if isinstance(result, Exception):
+                logger.error("Error processing paper %s: %s", paper['id'], result)
                 # Mark as failed but don't update other fields
-                paper['processing_error'] = str(e)
+                paper['processing_error'] = str(result)
+                continue
+            
+            # Update paper with processed information
+            paper.update({
+                'brief_overview': result.get('brief_overview', 'Not provided'),
+                'technical_explanation': result.get('technical_explanation', 'Not provided'),
+                'attack_categories': result.get('categories', ['unclassified']),
+                'relevance_score': result.get('relevance_score', 0),
+                'processed': True,
+                'processed_at': datetime.datetime.now().isoformat()
+            })
             
-            processed_batch.append(paper)
+            logger.info("Successfully processed paper: %s", paper['id'])
         
-        return processed_batch
+        return batch
+    
+    @staticmethod
+    def _cache_key(paper: Dict[str, Any]) -> str:
+        """Hash the paper content that determines the LLM analysis."""
+        return hashlib.sha256(f"{paper['title']}\0{paper['summary']}".encode()).hexdigest()
+    
+    async def _analyze_paper(self, paper: Dict[str, Any]) -> Dict[str, Any]:
+        """Create the prompt for a paper, call the LLM and parse its response."""
+        prompt = self._create_prompt(paper)
+        async with self._semaphore:
+            llm_response = await self._call_llm(prompt)
+        return self._parse_response(llm_response)
     
     def _create_prompt(self, paper: Dict[str, Any]) -> str:
         """Create prompt for LLM analysis."""
-        prompt = f"""
-        You are an expert in AI security and AI red teaming research. Analyze this research paper and provide:
-        
-        1. A brief overview (2-3 sentences summarizing the paper's main contribution)
-        2. A technical explanation (5-7 sentences explaining the key technical details)
-        3. Categorization by attack type (choose the most relevant categories from: prompt injection, jailbreaking, adversarial examples, 
-           model extraction, data poisoning, model backdoor attacks, privacy attacks, model stealing, 
-           reward hacking, social engineering, or any other relevant category). They must be related to AI Red teaming research specifically. 
-        4. Relevance score for AI red teaming (1-10, with 10 being most relevant)
-        
-        Paper Title: {paper['title']}
-        Authors: {', '.join(paper['authors'])}
-        Abstract: {paper['summary']}
-        
-        Return ONLY a JSON object with these keys:
-        {{
-          "brief_overview": "...",
-          "technical_explanation": "...",
-          "categories": ["category1", "category2"],
-          "relevance_score": number
-        }}
-        """
-        return prompt
+        return _PROMPT_TMPL.format(
+            title=paper['title'],
+            authors=', '.join(paper['authors']),
+            abstract=paper['summary']
+        )
     
-    def _call_llm(self, prompt: str) -> str:
+    async def _call_llm(self, prompt: str) -> str:
         """Call the LLM API with the prompt."""
         try:
             if LLM_PROVIDER == "anthropic":
-                response = self.client.messages.create(
+                response = await self.client.messages.create(
                     model=self.model,
                     max_tokens=1024,
                     messages=[
@@ -136,7 +218,7 @@ class PaperProcessor:
                 return response.content[0].text
                 
             elif LLM_PROVIDER == "openai":
-                response = self.client.chat.completions.create(
+                response = await self.client.chat.completions.create(
                     model=self.model,
                     messages=[
                         {"role": "system", "content": "You are a helpful AI research assistant skilled at analyzing academic papers."},
@@ -147,30 +229,39 @@ class PaperProcessor:
                 return response.choices[0].message.content
                 
         except Exception as e:
-            self.logger.error(f"API call failed: {str(e)}")
+            logger.error(f"API call failed: {str(e)}")
             raise
     
+    def _decode_json(self, response: str, start_idx: int) -> Dict[str, Any]:
+        """Decode the JSON object starting at ``start_idx``."""
+        if _json_loads is not None:
+            try:
+                # Common case: the rest of the response is exactly one JSON object
+                return _json_loads(response[start_idx:].rstrip())
+            except json.JSONDecodeError:
+                pass
+        # Decode just the object, ignoring any trailing prose or code fence
+        return _JSON_DECODER.raw_decode(response, start_idx)[0]
+    
     def _parse_response(self, response: str) -> Dict[str, Any]:
         """Parse the JSON response from the LLM."""
         try:
-            # Find and extract JSON from response
+            # Decode the first JSON object in the response, ignoring any text after it
             start_idx = response.find('{')
-            end_idx = response.rfind('}') + 1
             
-            if start_idx >= 0 and end_idx > 0:
-                json_str = response[start_idx:end_idx]
-                result = json.loads(json_str)
+            if start_idx >= 0:
+                result = self._decode_json(response, start_idx)
                 
                 # Validate required fields
                 if not all(k in result for k in ['brief_overview', 'technical_explanation', 'categories', 'relevance_score']):
                     missing = [k for k in ['brief_overview', 'technical_explanation', 'categories', 'relevance_score'] if k not in result]
-                    self.logger.warning(f"Missing required fields in LLM response: {missing}")
+                    logger.warning(f"Missing required fields in LLM response: {missing}")
                 
                 return result
             else:
-                self.logger.error("Could not find JSON in response")
+                logger.error("Could not find JSON in response")
                 raise ValueError("No JSON found in response")
                 
         except json.JSONDecodeError as e:
-            self.logger.error(f"Failed to parse JSON: {str(e)}, Response: {response[:200]}...")
+            logger.error(f"Failed to parse JSON: {str(e)}, Response: {response[:200]}...")
             raise